@@ -1,11 +1,111 @@
+from functools import lru_cache
 import numpy as np
-from scipy.special import betainc
-from matplotlib import cm, rcParams
-from matplotlib.colors import ListedColormap
+from scipy.special import betainc, btdtria
+from matplotlib import colormaps, rcParams
+from matplotlib.colors import ListedColormap, LinearSegmentedColormap
 from matplotlib.pyplot import gca
-from scipy.optimize import root_scalar
 
-def warp_colormap(basemap, z, beta=1, Nentries=256):
+# Number of samples of the warp used for kind='segmented' colormaps.
+_Nsegments = 32
+
+
+class _CmapKey:
+    """
+    Hashable handle on a colormap so that it can be used as a cache key.
+    Colormaps hash on their name but compare equal only if their colours
+    also agree, so distinct maps sharing a name do not collide.
+    """
+    __slots__ = ('cmap',)
+
+    def __init__(self, cmap):
+        self.cmap = cmap
+
+    def __hash__(self):
+        return hash((self.cmap.name, self.cmap.N))
+
+    def __eq__(self, other):
+        if not isinstance(other, _CmapKey):
+            return False
+        return (self.cmap is other.cmap
+                or (self.cmap.name == other.cmap.name
+                    and self.cmap == other.cmap))
+
+
+@lru_cache(maxsize=128)
+def _build_warped(cmap_key, z, beta, Nsamples):
+    """
+    Cached worker for `warp_colormap`; cmap_key is a `_CmapKey`.
+    Returns the (read-only) RGBA colours of the warped basemap at Nsamples
+    equally spaced points.
+    """
+    basemap = cmap_key.cmap
+    y = np.linspace(0, 1, Nsamples)
+
+    # With beta = 1 and z = 0.5 the warp is the identity.  z and beta are
+    # the caller's exact values, so only an exact identity is short-cut.
+    if beta == 1 and z == 0.5:
+        x = y
+    else:
+        # alpha is chosen so that betainc(alpha, beta, z) = 0.5; btdtria
+        # inverts the incomplete beta function with respect to alpha.
+        alpha = btdtria(0.5, beta, z)
+        x = betainc(alpha, beta, y)
+
+    rgba = basemap(x)
+    rgba.flags.writeable = False
+    return rgba
+
+
+def _minmax(X, blocksize=1 << 16, minsize=1 << 22):
+    """
+    Return (X.min(), X.max()) in a single sweep through memory.
+
+    Arrays of at least minsize elements, which are too big to stay in 
+    cache, are reduced in blocks of blocksize elements that do fit, so 
+    each block is read from main memory once for both reductions rather
+    than the whole array being traversed twice.  Smaller arrays are 
+    reduced directly, as the block loop would only add overhead.  Masked 
+    arrays are compressed to their unmasked values first, which is much 
+    faster than the masked reductions.
+    """
+    if np.ma.isMaskedArray(X):
+        if X.mask is np.ma.nomask:
+            data = X.data
+        else:
+            data = X.compressed()
+            if data.size == 0:
+                return X.min(), X.max()
+    else:
+        data = np.asarray(X)
+    if not (data.flags.c_contiguous or data.flags.f_contiguous):
+        # Flattening would copy the whole array.
+        return data.min(), data.max()
+
+    flat = np.ravel(data, order='K')
+    if flat.size < minsize:
+        return flat.min(), flat.max()
+
+    vmin = vmax = flat[0]
+    for start in range(0, flat.size, blocksize):
+        block = flat[start:start+blocksize]
+        vmin = np.minimum(vmin, block.min())
+        vmax = np.maximum(vmax, block.max())
+    return vmin, vmax
+
+
+def _check_warp(z, beta):
+    """
+    Raise ValueError unless 0 < z < 1 and beta > 0 (elementwise).
+    """
+    z = np.asarray(z)
+    beta = np.asarray(beta)
+    if not np.all((0 < z) & (z < 1)):
+        raise ValueError(f"z must lie strictly between 0 and 1, not {z}")
+    if not np.all(beta > 0):
+        raise ValueError(f"beta must be positive, not {beta}")
+
+
+def warp_colormap(basemap, z, beta=1, Nentries=256, kind='listed'):
     """
     Construct a new colormap by warping basemap so that the colour 
     in "middle" of the basemap is (ie, corresponding to a value of 0.5) 
@@ -34,11 +134,18 @@ def warp_colormap(basemap, z, beta=1, Nentries=256):
         
     Nentries: int
         Number of entries in the new colourmap.
+
+    kind: {'listed', 'segmented'}
+        If 'listed' (the default), the warp is evaluated at each of the 
+        Nentries colours.  If 'segmented', it is evaluated at 32 points 
+        and the colours in between are linearly interpolated.  This is 
+        a close approximation for smooth basemaps and beta >= 1, but 
+        not for beta < 1, where the warp is very steep at its ends.
         
     Returns
     -------
     
-    newmap:  ListedColormap
+    newmap:  ListedColormap or LinearSegmentedColormap
         The warped colourmap.
         
         
@@ -56,23 +163,123 @@ def warp_colormap(basemap, z, beta=1, Nentries=256):
     If the range of the data is not [0, 1], then z is linearly mapped 
     to the data range so if the data range is (100, 120) and z = 0.8, 
     then the emphasised values will be around 116.    
+
+    Warped colourmaps are cached, so repeated calls with the same 
+    arguments (for instance, when animating) are cheap.  Each call 
+    returns a new colourmap with its own colours, so the result may be 
+    modified freely.
     """
+    if kind not in ('listed', 'segmented'):
+        raise ValueError(f"kind must be 'listed' or 'segmented', "
+                         f"not {kind!r}")
+    _check_warp(z, beta)
     if isinstance(basemap, str):
-        basemap = cm.get_cmap(basemap)
-        
-    def objective(alpha):
-        return betainc(alpha, beta, z) - 0.5
+        basemap = colormaps[basemap]
 
-    soln = root_scalar(objective, bracket=(1e-10, 1e2))
-    alpha = soln.root
-    
-    rgba = np.zeros((Nentries, 4))
-    for n, y in enumerate(np.linspace(0, 1, Nentries)):
-        x = betainc(alpha, beta, y)
-        rgba[n,:] = basemap(x)
-        newmap = ListedColormap(rgba)
+    Nsamples = Nentries if kind == 'listed' else _Nsegments
+    rgba = _build_warped(_CmapKey(basemap), float(z), float(beta), Nsamples)
+    if kind == 'listed':
+        newmap = ListedColormap(rgba.copy())
+    else:
+        newmap = LinearSegmentedColormap.from_list('from_list', rgba,
+                                                   N=Nentries)
     return newmap
 
+
+def warp_colormaps(basemap, zs, betas=1, Nentries=256):
+    """
+    Construct several warped colormaps at once, as `warp_colormap` does 
+    for each pair of z and beta.  This is much quicker than repeated 
+    calls to `warp_colormap` when sweeping through many values of z or 
+    beta, for instance, to make the frames of an animation.
+    
+    Parameters
+    ----------
+    
+    basemap:  Matplotlib ColorMap or string naming one.
+        The colormap to warp
+    
+    zs:  float or array-like of floats (0 < z < 1)
+        The locations that the middle of the basemap is warped to.
+
+    betas: float or array-like of floats (beta > 0)
+        The rates of change of colours close to each z. zs and betas 
+        are broadcast against each other.
+        
+    Nentries: int
+        Number of entries in each new colourmap.
+        
+    Returns
+    -------
+    
+    newmaps:  list of ListedColormap
+        The warped colourmaps, one for each (broadcast) pair of z and beta,
+        in C order if zs and betas broadcast to more than one dimension.
+        
+    Example
+    -------
+    
+    Sweep the emphasised value across the range of the data
+    >>> cmaps = warp_colormaps('jet', zs=np.linspace(0.1, 0.9, 50), betas=3)
+    """
+    if isinstance(basemap, str):
+        basemap = colormaps[basemap]
+
+    _check_warp(zs, betas)
+    zs, betas = (np.ravel(a) for a in np.broadcast_arrays(zs, betas))
+
+    alpha = btdtria(0.5, betas, zs)
+    y = np.linspace(0, 1, Nentries)
+    x = betainc(alpha[:,None], betas[:,None], y)
+    rgba = basemap(x)
+    # Copy each row so that a single map does not keep the whole batch alive.
+    return [ListedColormap(c.copy()) for c in rgba]
+
+
+def _prepare_warped(data, cmap, vmin, vmax, vmid, beta, Nentries):
+    """
+    Common set-up for `wimshow`, `wpcolormesh` and `wpcolor`: fill in
+    the defaults for cmap, vmin, vmax and vmid from rcParams and the
+    data, and warp the colormap accordingly.
+
+    Returns
+    -------
+    warped, vmin, vmax
+        The warped colormap and the data range that it covers.
+    """
+    if cmap is None:
+        cmap = rcParams['image.cmap']
+    if isinstance(cmap, str):
+        basemap = colormaps[cmap]
+    else:
+        basemap = cmap
+
+    if vmin is None and vmax is None:
+        vmin, vmax = _minmax(data)
+    elif vmin is None:
+        vmin = data.min()
+    elif vmax is None:
+        vmax = data.max()
+
+    if vmid is None:
+        vmid = (vmin + vmax)/2
+
+    span = np.ma.filled(vmax - vmin, np.nan)
+    if span == 0 or not np.isfinite(span):
+        # Constant, NaN or wholly masked data, so there is no range for the 
+        # warp to act on.
+        z, beta = 0.5, 1
+    else:
+        z = (vmid - vmin)/span
+    # With beta = 1 and vmid midway between vmin and vmax the warp is the
+    # identity, so the colormap is passed to matplotlib as it was given.
+    if beta == 1 and abs(z - 0.5) < 1e-12 and Nentries == basemap.N:
+        warped = cmap
+    else:
+        warped = warp_colormap(basemap, z, beta=beta, Nentries=Nentries)
+    return warped, vmin, vmax
+
+
 def wimshow(X,
             cmap=None,
             vmin=None, vmax=None, vmid=None, beta=1, Nentries=256,
@@ -136,22 +343,10 @@ def wimshow(X,
     All other parameters are passed directly to `imshow`.
     """
     assert len(X.shape) == 2, "wimshow only supports scalar data; use imshow for RGB and RGBA data"
-    if cmap is None:
-        cmap = rcParams['image.cmap']
-
-    if vmin is None:
-        vmin = X.min()
-
-    if vmax is None:
-        vmax = X.max()
-
-    if vmid is None:
-        vmid = (vmin + vmax)/2
-
+    warped, vmin, vmax = _prepare_warped(X, cmap, vmin, vmax, vmid,
+                                         beta, Nentries)
     if ax is None:
         ax = gca()
-    z = (vmid - vmin)/(vmax-vmin)
-    warped = warp_colormap(cmap, z, beta=beta, Nentries=Nentries)
     return ax.imshow(X, cmap=warped, vmin=vmin, vmax=vmax, **kwargs)
 
 
@@ -231,22 +426,10 @@ def wpcolormesh(*args,
     else:
         raise TypeError(f'wpcolormesh() takes 1 or 3 positional arguments '
                         f'but {len(args)} were given')
-    if cmap is None:
-        cmap = rcParams['image.cmap']
-
-    if vmin is None:
-        vmin = C.min()
-
-    if vmax is None:
-        vmax = C.max()
-
-    if vmid is None:
-        vmid = (vmin + vmax)/2
-
+    warped, vmin, vmax = _prepare_warped(C, cmap, vmin, vmax, vmid,
+                                         beta, Nentries)
     if ax is None:
         ax = gca()
-    z = (vmid - vmin)/(vmax-vmin)
-    warped = warp_colormap(cmap, z, beta=beta, Nentries=Nentries)
     return ax.pcolormesh(*args, cmap=warped, vmin=vmin, vmax=vmax, **kwargs)
 
 
@@ -327,20 +510,8 @@ def wpcolor(*args,
     else:
         raise TypeError(f'wpcolor() takes 1 or 3 positional arguments '
                         f'but {len(args)} were given')
-    if cmap is None:
-        cmap = rcParams['image.cmap']
-
-    if vmin is None:
-        vmin = C.min()
-
-    if vmax is None:
-        vmax = C.max()
-
-    if vmid is None:
-        vmid = (vmin + vmax)/2
-
+    warped, vmin, vmax = _prepare_warped(C, cmap, vmin, vmax, vmid,
+                                         beta, Nentries)
     if ax is None:
         ax = gca()
-    z = (vmid - vmin)/(vmax-vmin)
-    warped = warp_colormap(cmap, z, beta=beta, Nentries=Nentries)
     return ax.pcolor(*args, cmap=warped, vmin=vmin, vmax=vmax, **kwargs)